@@ -1,34 +1,105 @@
+import asyncio
+import atexit
 import logging
 import os
+import queue
 import re
-import threading
 import time
-from collections.abc import Awaitable, Callable
-from collections import defaultdict, deque
-from typing import Literal
-
-from fastapi import FastAPI, HTTPException, Request
+from collections.abc import AsyncIterator
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Literal
+
+import httpx
+import msgspec
+import numpy as np
+import orjson
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
-from openai import OpenAI
-from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai import AsyncOpenAI, AsyncStream
+from redis.asyncio import Redis
+from starlette.background import BackgroundTask
 
 logger = logging.getLogger("affirmly-api")
-logging.basicConfig(level=logging.INFO)
+
+# Request handlers only enqueue log records; a listener thread writes them to stderr.
+_log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(), respect_handler_level=True)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
 RATE_LIMIT_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "10"))
 RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+REDIS_URL = os.getenv("REDIS_URL", "")
+REDIS_TIMEOUT_SECONDS = float(os.getenv("REDIS_TIMEOUT_SECONDS", "0.5"))
+AFFIRM_CACHE_ENABLED = os.getenv("AFFIRM_CACHE_ENABLED", "false").strip().lower() in {"1", "true", "yes"}
+AFFIRM_CACHE_SIMILARITY = float(os.getenv("AFFIRM_CACHE_SIMILARITY", "0.92"))
+AFFIRM_CACHE_EMBEDDING_MODEL = os.getenv("AFFIRM_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+MAX_CACHE = 1024
 
 if not OPENAI_API_KEY:
     logger.warning("OPENAI_API_KEY is not set. /api/affirmation will fail until configured.")
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+openai_client: AsyncOpenAI | None = None
+redis_client: Redis | None = None
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (FastAPI's own ORJSONResponse is deprecated)."""
+
+    def render(self, content: object) -> bytes:
+        return orjson.dumps(content)
 
-app = FastAPI(title="Affirmly API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    global openai_client, redis_client
+    loop_type = type(asyncio.get_running_loop())
+    logger.info("Event loop: %s.%s", loop_type.__module__, loop_type.__qualname__)
+    http_client: httpx.AsyncClient | None = None
+    if OPENAI_API_KEY:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+            timeout=httpx.Timeout(15.0, connect=3.0),
+            http2=True,
+        )
+        openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+    if REDIS_URL:
+        # Short timeouts so an unreachable Redis falls back to the in-process counter quickly.
+        redis_client = Redis.from_url(
+            REDIS_URL,
+            socket_connect_timeout=REDIS_TIMEOUT_SECONDS,
+            socket_timeout=REDIS_TIMEOUT_SECONDS,
+        )
+    sweeper = asyncio.create_task(_sweep_rate_limit_counters())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+        if redis_client is not None:
+            await redis_client.aclose()
+            redis_client = None
+        if http_client is not None:
+            await http_client.aclose()
+            openai_client = None
+
+
+app = FastAPI(
+    title="Affirmly API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,8 +109,11 @@ app.add_middleware(
     allow_headers=["Content-Type", "Authorization"],
 )
 
-_rate_limit_storage: dict[str, deque[float]] = defaultdict(deque)
-_rate_limit_lock = threading.Lock()
+# In-process fallback used when REDIS_URL is unset: fixed-window request counts keyed by
+# (client, window index). Every access happens on the event loop thread, so plain dict
+# operations are enough and no lock is needed. Insertion order doubles as age, so the oldest
+# entry is evicted first once RATE_LIMIT_MAX_CLIENTS is reached.
+_counters: OrderedDict[tuple[str, int], int] = OrderedDict()
 
 SUPPORTED_LANGUAGES: dict[str, str] = {
     "en": "English",
@@ -59,8 +133,7 @@ FEELING_SUGGESTIONS: dict[str, str] = {
     "conf": "confused",
 }
 
-EMOJI_PATTERN = re.compile(
-    "["
+_EMOJI_RANGES = (
     "\U0001F300-\U0001F6FF"
     "\U0001F700-\U0001F77F"
     "\U0001F780-\U0001F7FF"
@@ -69,15 +142,19 @@ EMOJI_PATTERN = re.compile(
     "\U0001FA00-\U0001FAFF"
     "\U00002700-\U000027BF"
     "\U00002600-\U000026FF"
-    "]",
-    flags=re.UNICODE,
+)
+
+# One scan yields both emoji hits (named group) and word-character runs. Runs stop before
+# any emoji-range character, since some of those (e.g. dingbat digits) also match \w.
+_FEELING_TOKEN_RE = re.compile(
+    rf"(?P<emoji>[{_EMOJI_RANGES}])|(?:(?![{_EMOJI_RANGES}])[^\W\d_])+", flags=re.UNICODE
 )
 
 
 def _get_client_identifier(request: Request) -> str:
     forwarded_for = request.headers.get("x-forwarded-for")
     if forwarded_for:
-        first = forwarded_for.split(",")[0].strip()
+        first = forwarded_for.partition(",")[0].strip()
         if first:
             return first
     if request.client and request.client.host:
@@ -85,75 +162,220 @@ def _get_client_identifier(request: Request) -> str:
     return "unknown-client"
 
 
-@app.middleware("http")
-async def rate_limit_middleware(
-    request: Request, call_next: Callable[[Request], Awaitable[Response]]
-) -> Response:
-    if request.method == "POST" and request.url.path == "/api/affirmation":
-        now = time.time()
-        client_id = _get_client_identifier(request)
-        with _rate_limit_lock:
-            bucket = _rate_limit_storage[client_id]
-            cutoff = now - RATE_LIMIT_WINDOW_SECONDS
-            while bucket and bucket[0] < cutoff:
-                bucket.popleft()
-            if len(bucket) >= RATE_LIMIT_MAX_REQUESTS:
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "error": "RateLimitExceeded",
-                        "message": "Too many requests. Please try again shortly.",
-                    },
-                )
-            bucket.append(now)
-    response = await call_next(request)
-    return response
-
-
-class AffirmationRequest(BaseModel):
-    model_config = ConfigDict(str_strip_whitespace=True)
-
-    name: str = Field(min_length=1, max_length=60)
-    feeling: str = Field(min_length=2, max_length=280)
-    details: str | None = Field(default=None, max_length=500)
+def _count_request_locally(client_id: str, bucket: int) -> int:
+    key = (client_id, bucket)
+    count = _counters.get(key, 0) + 1
+    _counters[key] = count
+    if count == 1 and len(_counters) > RATE_LIMIT_MAX_CLIENTS:
+        _counters.popitem(last=False)
+    return count
+
+
+async def _count_request(client_id: str) -> int:
+    bucket = int(time.time()) // RATE_LIMIT_WINDOW_SECONDS
+    if redis_client is None:
+        return _count_request_locally(client_id, bucket)
+
+    key = f"rl:{client_id}:{bucket}"
+    try:
+        async with redis_client.pipeline() as pipe:
+            count, _ = await pipe.incr(key).expire(key, RATE_LIMIT_WINDOW_SECONDS * 2).execute()
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Redis rate limit check failed, using in-process counter: %s", exc)
+        return _count_request_locally(client_id, bucket)
+    return int(count)
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+async def _rate_limit_dep(request: Request) -> None:
+    count = await _count_request(_get_client_identifier(request))
+    if count > RATE_LIMIT_MAX_REQUESTS:
+        raise RateLimitExceeded
+
+
+# Routes that count against the per-client rate limit; /health and docs stay outside it.
+limited = APIRouter(dependencies=[Depends(_rate_limit_dep)])
+
+
+async def _sweep_rate_limit_counters() -> None:
+    while True:
+        await asyncio.sleep(RATE_LIMIT_WINDOW_SECONDS)
+        current_bucket = int(time.time()) // RATE_LIMIT_WINDOW_SECONDS
+        for key in [key for key in _counters if key[1] < current_bucket - 1]:
+            del _counters[key]
+
+
+class AffirmationRequest(msgspec.Struct, frozen=True):
+    name: str
+    feeling: str
+    details: str | None = None
     language: Literal["en", "af", "la", "zh", "ru", "de", "fr", "es"] = "en"
 
-    @field_validator("name")
-    @classmethod
-    def name_is_alpha_friendly(cls, value: str) -> str:
-        cleaned = "".join(ch for ch in value if ch.isalnum() or ch in " -'")
-        if not cleaned.strip():
-            raise ValueError("Name must contain valid characters.")
-        return cleaned.strip()
-
-    @field_validator("feeling")
-    @classmethod
-    def feeling_is_descriptive(cls, value: str) -> str:
-        feeling = value.strip()
-        if not feeling:
-            raise ValueError("Please describe how you are feeling.")
-
-        if EMOJI_PATTERN.search(feeling):
+
+class AffirmationResponse(msgspec.Struct, frozen=True):
+    affirmation: str
+
+
+# (min, max) lengths, checked after whitespace is stripped, so they are not msgspec.Meta
+# constraints on the struct; _validate_request enforces them and the OpenAPI schema shows them.
+_FIELD_LENGTHS: dict[str, tuple[int, int]] = {
+    "name": (1, 60),
+    "feeling": (2, 280),
+    "details": (0, 500),
+}
+
+
+def _field_error(field: str, error_type: str, message: str, value: object) -> RequestValidationError:
+    return RequestValidationError(
+        [{"type": error_type, "loc": ("body", field), "msg": message, "input": value}]
+    )
+
+
+def _check_length(field: str, value: str) -> str:
+    min_length, max_length = _FIELD_LENGTHS[field]
+    if len(value) < min_length:
+        raise _field_error(
+            field,
+            "string_too_short",
+            f"String should have at least {min_length} character{'' if min_length == 1 else 's'}",
+            value,
+        )
+    if len(value) > max_length:
+        raise _field_error(
+            field,
+            "string_too_long",
+            f"String should have at most {max_length} characters",
+            value,
+        )
+    return value
+
+
+def name_is_alpha_friendly(value: str) -> str:
+    cleaned = "".join(ch for ch in value if ch.isalnum() or ch in " -'")
+    if not cleaned.strip():
+        raise ValueError("Name must contain valid characters.")
+    return cleaned.strip()
+
+
+def feeling_is_descriptive(value: str) -> str:
+    feeling = value.strip()
+    if not feeling:
+        raise ValueError("Please describe how you are feeling.")
+
+    letters: list[str] = []
+    for match in _FEELING_TOKEN_RE.finditer(feeling):
+        if match.lastgroup == "emoji":
             raise ValueError("Please use descriptive text instead of emoji for your feeling.")
+        letters.append(match.group())
 
-        shorthand = feeling.lower()
-        if shorthand in FEELING_SUGGESTIONS:
-            suggestion = FEELING_SUGGESTIONS[shorthand]
-            raise ValueError(f"Did you mean '{suggestion}'? Please use a full descriptive word.")
+    suggestion = FEELING_SUGGESTIONS.get(feeling.lower())
+    if suggestion is not None:
+        raise ValueError(f"Did you mean '{suggestion}'? Please use a full descriptive word.")
 
-        alpha_count = sum(1 for char in feeling if char.isalpha())
-        if alpha_count < 3:
-            raise ValueError("Please use valid words to describe your feeling.")
+    # Runs can still hold numeric characters such as "½", which str.isalpha() rejects.
+    alpha_count = sum(len(run) if run.isalpha() else sum(map(str.isalpha, run)) for run in letters)
+    if alpha_count < 3:
+        raise ValueError("Please use valid words to describe your feeling.")
 
-        words_with_letters = [word for word in feeling.split() if any(char.isalpha() for char in word)]
-        if len(words_with_letters) == 1 and len(words_with_letters[0]) < 5:
-            raise ValueError("Please be more descriptive, for example: 'anxious about my presentation'.")
+    words_with_letters = [word for word in feeling.split() if any(map(str.isalpha, word))]
+    if len(words_with_letters) == 1 and len(words_with_letters[0]) < 5:
+        raise ValueError("Please be more descriptive, for example: 'anxious about my presentation'.")
 
-        return feeling
+    return feeling
 
 
-class AffirmationResponse(BaseModel):
-    affirmation: str
+def _validate_request(payload: AffirmationRequest) -> AffirmationRequest:
+    name = _check_length("name", payload.name.strip())
+    try:
+        name = name_is_alpha_friendly(name)
+    except ValueError as exc:
+        raise _field_error("name", "value_error", f"Value error, {exc}", name) from exc
+
+    feeling = _check_length("feeling", payload.feeling.strip())
+    try:
+        feeling = feeling_is_descriptive(feeling)
+    except ValueError as exc:
+        raise _field_error("feeling", "value_error", f"Value error, {exc}", feeling) from exc
+
+    details = payload.details
+    if details is not None:
+        details = _check_length("details", details.strip())
+
+    return msgspec.structs.replace(payload, name=name, feeling=feeling, details=details)
+
+
+_AFFIRMATION_REQUEST_DECODER = msgspec.json.Decoder(AffirmationRequest)
+
+
+_MSGSPEC_PATH_RE = re.compile(r"^(?P<message>.*?)(?: - at `\$(?P<path>[^`]*)`)?$", flags=re.DOTALL)
+_MISSING_FIELD_RE = re.compile(r"^Object missing required field `(?P<field>[^`]+)`$")
+
+
+def _msgspec_error_details(exc: msgspec.ValidationError) -> dict[str, object]:
+    # msgspec reports the failing location only inside the message, e.g. "... - at `$.language`".
+    parsed = _MSGSPEC_PATH_RE.match(str(exc))
+    message = parsed.group("message")
+    loc: tuple[str, ...] = ("body", *filter(None, (parsed.group("path") or "").split(".")))
+
+    missing = _MISSING_FIELD_RE.match(message)
+    if missing:
+        return {
+            "type": "missing",
+            "loc": (*loc, missing.group("field")),
+            "msg": "Field required",
+            "input": None,
+        }
+    if message.startswith("Invalid enum value"):
+        error_type = "literal_error"
+    elif message.startswith("Expected `object`"):
+        error_type = "model_attributes_type"
+    elif message.startswith("Expected `str"):
+        error_type = "string_type"
+    else:
+        error_type = "value_error"
+    return {"type": error_type, "loc": loc, "msg": message, "input": None}
+
+
+def _require_json_content_type(request: Request) -> None:
+    # The body is read directly, so FastAPI's JSON content-type check (CVE-2021-32677) is
+    # repeated here; otherwise text/plain "simple" cross-origin requests would be accepted.
+    media_type = request.headers.get("content-type", "").partition(";")[0].strip().lower()
+    if media_type != "application/json" and not (
+        media_type.startswith("application/") and media_type.endswith("+json")
+    ):
+        raise HTTPException(status_code=415, detail="Content-Type must be application/json.")
+
+
+def _decode_affirmation_request(body: bytes) -> AffirmationRequest:
+    try:
+        payload = _AFFIRMATION_REQUEST_DECODER.decode(body)
+    except msgspec.ValidationError as exc:
+        raise RequestValidationError([_msgspec_error_details(exc)]) from exc
+    except msgspec.DecodeError as exc:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body",), "msg": str(exc), "input": None}]
+        ) from exc
+    return _validate_request(payload)
+
+
+# Published in OpenAPI only; neither payload is validated through these schemas at runtime.
+_SCHEMA_COMPONENTS = msgspec.json.schema_components([AffirmationRequest, AffirmationResponse])[1]
+
+
+def _with_length_limits(schema: dict[str, Any]) -> dict[str, Any]:
+    for field, (min_length, max_length) in _FIELD_LENGTHS.items():
+        field_schema = schema["properties"][field]
+        for option in field_schema.get("anyOf", [field_schema]):
+            if option.get("type") == "string":
+                option.update(minLength=min_length, maxLength=max_length)
+    return schema
+
+
+_AFFIRMATION_REQUEST_SCHEMA = _with_length_limits(_SCHEMA_COMPONENTS["AffirmationRequest"])
+_AFFIRMATION_RESPONSE_SCHEMA = _SCHEMA_COMPONENTS["AffirmationResponse"]
 
 
 SAFE_SYSTEM_PROMPT = (
@@ -167,59 +389,308 @@ SAFE_SYSTEM_PROMPT = (
     "Always respond in the exact language requested by the user."
 )
 
+# OpenAI only caches prompt prefixes of 1024+ tokens, so at the system prompt's current length
+# this key has no effect; it keeps requests grouped if the static prefix grows past that.
+PROMPT_CACHE_KEY = "affirmly-affirmation-v1"
+
+
+_NO_DETAILS = "No additional details provided."
+
+_PROMPT_TEMPLATES: dict[str, str] = {
+    code: (
+        f"Preferred language: {language}\n"
+        "Name: {name}\n"
+        "Feeling: {feeling}\n"
+        "Details: {details}\n\n"
+        "Create one personalized affirmation in the preferred language."
+    )
+    for code, language in SUPPORTED_LANGUAGES.items()
+}
+
 
 def _build_user_prompt(payload: AffirmationRequest) -> str:
-    details = payload.details.strip() if payload.details else "No additional details provided."
-    selected_language = SUPPORTED_LANGUAGES.get(payload.language, "English")
+    # Fields are already stripped by _validate_request.
+    return _PROMPT_TEMPLATES[payload.language].format(
+        name=payload.name, feeling=payload.feeling, details=payload.details or _NO_DETAILS
+    )
+
+
+def _normalize(value: str | None) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def _cache_key(payload: AffirmationRequest) -> str:
+    # The name is part of the key because affirmations are personalized with it.
     return (
-        f"Preferred language: {selected_language}\n"
-        f"Name: {payload.name}\n"
-        f"Feeling: {payload.feeling}\n"
-        f"Details: {details}\n\n"
-        "Create one personalized affirmation in the preferred language."
+        f"{payload.language}|{_normalize(payload.name)}|"
+        f"{_normalize(payload.feeling)}|{_normalize(payload.details)}"
     )
 
 
-@app.get("/health")
-async def health() -> dict[str, str]:
-    return {"status": "ok"}
+def _cache_scope(payload: AffirmationRequest) -> str:
+    return f"{payload.language}|{_normalize(payload.name)}"
 
 
-@app.post("/api/affirmation", response_model=AffirmationResponse)
-async def create_affirmation(payload: AffirmationRequest) -> dict[str, str]:
-    if not openai_client:
-        raise HTTPException(status_code=500, detail="Server is missing OPENAI_API_KEY.")
+def _semantic_text(payload: AffirmationRequest) -> str:
+    return f"{_normalize(payload.feeling)}|{_normalize(payload.details)}"
+
+
+class _AffirmationCache:
+    """Exact-match LRU of affirmations with a semantic fallback over prompt embeddings."""
 
+    def __init__(self, max_entries: int, threshold: float) -> None:
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._texts: OrderedDict[str, str] = OrderedDict()
+        self._embeddings: dict[str, tuple[str, np.ndarray]] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: str) -> str | None:
+        async with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+            return text
+
+    async def get_similar(self, scope: str, embedding: np.ndarray) -> str | None:
+        async with self._lock:
+            keys = [key for key, (entry_scope, _) in self._embeddings.items() if entry_scope == scope]
+            if not keys:
+                return None
+            matrix = np.stack([self._embeddings[key][1] for key in keys])
+            scores = matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._texts.move_to_end(keys[best])
+            return self._texts[keys[best]]
+
+    async def put(self, key: str, scope: str, embedding: np.ndarray | None, text: str) -> None:
+        async with self._lock:
+            self._texts[key] = text
+            self._texts.move_to_end(key)
+            if embedding is not None:
+                self._embeddings[key] = (scope, embedding)
+            while len(self._texts) > self.max_entries:
+                evicted, _ = self._texts.popitem(last=False)
+                self._embeddings.pop(evicted, None)
+
+    def clear(self) -> None:
+        self._texts.clear()
+        self._embeddings.clear()
+
+
+_affirmation_cache = _AffirmationCache(MAX_CACHE, AFFIRM_CACHE_SIMILARITY)
+
+
+async def _embed_prompt(text: str) -> np.ndarray | None:
     try:
-        response = openai_client.responses.create(
-            model=OPENAI_MODEL,
-            temperature=0.7,
-            max_output_tokens=180,
-            input=[
-                {"role": "system", "content": SAFE_SYSTEM_PROMPT},
-                {"role": "user", "content": _build_user_prompt(payload)},
-            ],
-        )
-        text = (response.output_text or "").strip()
-        if not text:
+        result = await openai_client.embeddings.create(model=AFFIRM_CACHE_EMBEDDING_MODEL, input=text)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Embedding request failed, skipping semantic cache: %s", exc)
+        return None
+    vector = np.asarray(result.data[0].embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else None
+
+
+async def _find_cached_affirmation(
+    payload: AffirmationRequest,
+) -> tuple[str | None, np.ndarray | None]:
+    cached = await _affirmation_cache.get(_cache_key(payload))
+    if cached is not None:
+        return cached, None
+    embedding = await _embed_prompt(_semantic_text(payload))
+    if embedding is None:
+        return None, None
+    return await _affirmation_cache.get_similar(_cache_scope(payload), embedding), embedding
+
+
+_NULL_STRIP = {0: None}
+
+# Generations currently running, keyed by cache key, so identical concurrent requests share
+# one upstream call.
+_in_flight: dict[str, asyncio.Future[str]] = {}
+
+
+def _model_request(payload: AffirmationRequest) -> dict[str, object]:
+    return {
+        "model": OPENAI_MODEL,
+        "temperature": 0.7,
+        "max_output_tokens": 180,
+        "prompt_cache_key": PROMPT_CACHE_KEY,
+        "input": [
+            {"role": "system", "content": SAFE_SYSTEM_PROMPT},
+            {"role": "user", "content": _build_user_prompt(payload)},
+        ],
+    }
+
+
+async def _generate_affirmation(payload: AffirmationRequest, embedding: np.ndarray | None) -> str:
+    try:
+        response = await openai_client.responses.create(**_model_request(payload))
+        safe_text = (response.output_text or "").translate(_NULL_STRIP).strip()
+        if not safe_text:
             raise HTTPException(status_code=502, detail="Empty response from language model.")
 
-        safe_text = text.replace("\x00", "").strip()
-        return {"affirmation": safe_text}
+        if AFFIRM_CACHE_ENABLED:
+            await _affirmation_cache.put(
+                _cache_key(payload), _cache_scope(payload), embedding, safe_text
+            )
+        return safe_text
     except HTTPException:
         raise
-    except ValidationError as exc:
-        logger.exception("Validation error: %s", exc)
-        raise HTTPException(status_code=400, detail="Invalid input payload.") from exc
     except Exception as exc:  # noqa: BLE001
         logger.exception("OpenAI request failed: %s", exc)
         raise HTTPException(status_code=502, detail="Failed to generate affirmation.") from exc
 
 
+def _retrieve_exception(future: asyncio.Future[str]) -> None:
+    # Marks a failure as retrieved when no duplicate request was waiting on it.
+    if not future.cancelled():
+        future.exception()
+
+
+async def _coalesced_affirmation(payload: AffirmationRequest, embedding: np.ndarray | None) -> str:
+    key = _cache_key(payload)
+    pending = _in_flight.get(key)
+    while pending is not None and not pending.cancelled():
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+        # The leader was cancelled (e.g. its client disconnected); follow or become the next one.
+        pending = _in_flight.get(key)
+
+    future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+    future.add_done_callback(_retrieve_exception)
+    _in_flight[key] = future
+    try:
+        text = await _generate_affirmation(payload, embedding)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(text)
+        return text
+    finally:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+def _sse(data: dict[str, str], event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {orjson.dumps(data).decode()}\n\n"
+
+
+async def _replay_affirmation(text: str) -> AsyncIterator[str]:
+    yield _sse({"delta": text})
+    yield _sse({"affirmation": text}, event="done")
+
+
+async def _stream_affirmation(
+    payload: AffirmationRequest, embedding: np.ndarray | None, events: AsyncStream[Any]
+) -> AsyncIterator[str]:
+    parts: list[str] = []
+    try:
+        async for event in events:
+            if event.type != "response.output_text.delta":
+                continue
+            delta = event.delta.translate(_NULL_STRIP)
+            if delta:
+                parts.append(delta)
+                yield _sse({"delta": delta})
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("OpenAI stream failed: %s", exc)
+        yield _sse({"error": "HttpError", "message": "Failed to generate affirmation."}, event="error")
+        return
+    finally:
+        # Also runs on client disconnect, returning the connection to the httpx pool.
+        await events.close()
+
+    safe_text = "".join(parts).strip()
+    if not safe_text:
+        yield _sse({"error": "HttpError", "message": "Empty response from language model."}, event="error")
+        return
+
+    if AFFIRM_CACHE_ENABLED:
+        await _affirmation_cache.put(_cache_key(payload), _cache_scope(payload), embedding, safe_text)
+    yield _sse({"affirmation": safe_text}, event="done")
+
+
+async def _start_affirmation_stream(
+    payload: AffirmationRequest, embedding: np.ndarray | None
+) -> StreamingResponse:
+    # Opening the stream before responding keeps upstream failures as regular HTTP errors.
+    try:
+        events = await openai_client.responses.create(**_model_request(payload), stream=True)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("OpenAI request failed: %s", exc)
+        raise HTTPException(status_code=502, detail="Failed to generate affirmation.") from exc
+    # The background close covers a response that is never iterated; closing twice is harmless.
+    return StreamingResponse(
+        _stream_affirmation(payload, embedding, events),
+        media_type="text/event-stream",
+        background=BackgroundTask(events.close),
+    )
+
+
+@app.get("/health")
+async def health() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@limited.post(
+    "/api/affirmation",
+    response_model=None,
+    responses={
+        200: {
+            "description": "Generated affirmation, or server-sent events when stream=true.",
+            "content": {
+                "application/json": {"schema": _AFFIRMATION_RESPONSE_SCHEMA},
+                "text/event-stream": {},
+            },
+        }
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _AFFIRMATION_REQUEST_SCHEMA}},
+        }
+    },
+)
+async def create_affirmation(
+    request: Request, stream: bool = False
+) -> ORJSONResponse | StreamingResponse:
+    _require_json_content_type(request)
+    payload = _decode_affirmation_request(await request.body())
+    if not openai_client:
+        raise HTTPException(status_code=500, detail="Server is missing OPENAI_API_KEY.")
+
+    embedding = None
+    if AFFIRM_CACHE_ENABLED:
+        cached, embedding = await _find_cached_affirmation(payload)
+        if cached is not None:
+            if stream:
+                return StreamingResponse(_replay_affirmation(cached), media_type="text/event-stream")
+            return ORJSONResponse({"affirmation": cached})
+
+    if stream:
+        return await _start_affirmation_stream(payload, embedding)
+    return ORJSONResponse({"affirmation": await _coalesced_affirmation(payload, embedding)})
+
+
+app.include_router(limited)
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(
     request: Request, exc: RequestValidationError
-) -> JSONResponse:
+) -> ORJSONResponse:
     logger.info("Validation issue on %s: %s", request.url.path, exc)
     sanitized_details: list[dict[str, object]] = []
     for error in exc.errors():
@@ -231,7 +702,7 @@ async def validation_exception_handler(
             mutable_error["ctx"] = mutable_ctx
         sanitized_details.append(mutable_error)
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
         content={
             "error": "ValidationError",
@@ -241,19 +712,31 @@ async def validation_exception_handler(
     )
 
 
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exception_handler(request: Request, exc: RateLimitExceeded) -> ORJSONResponse:
+    logger.info("Rate limit exceeded on %s", request.url.path)
+    return ORJSONResponse(
+        status_code=429,
+        content={
+            "error": "RateLimitExceeded",
+            "message": "Too many requests. Please try again shortly.",
+        },
+    )
+
+
 @app.exception_handler(HTTPException)
-async def http_exception_handler(request: Request, exc: HTTPException) -> JSONResponse:
+async def http_exception_handler(request: Request, exc: HTTPException) -> ORJSONResponse:
     logger.info("HTTP issue on %s: %s", request.url.path, exc.detail)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"error": "HttpError", "message": str(exc.detail)},
     )
 
 
 @app.exception_handler(Exception)
-async def generic_exception_handler(request: Request, exc: Exception) -> JSONResponse:
+async def generic_exception_handler(request: Request, exc: Exception) -> ORJSONResponse:
     logger.exception("Unhandled error on %s: %s", request.url.path, exc)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"error": "InternalServerError", "message": "Unexpected server error."},
     )
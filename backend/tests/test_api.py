@@ -1,3 +1,6 @@
+import asyncio
+import json
+
 from fastapi.testclient import TestClient
 
 from app import main
@@ -8,21 +11,120 @@ class _FakeResponse:
         self.output_text = output_text
 
 
+class _FakeStreamEvent:
+    def __init__(self, event_type: str, delta: str = "") -> None:
+        self.type = event_type
+        self.delta = delta
+
+
+class _FakeStream:
+    def __init__(self, output_text: str, fail_after: int | None = None) -> None:
+        chunks = [output_text[index : index + 8] for index in range(0, len(output_text), 8)]
+        self._events = [
+            _FakeStreamEvent("response.created"),
+            *(_FakeStreamEvent("response.output_text.delta", chunk) for chunk in chunks),
+            _FakeStreamEvent("response.completed"),
+        ]
+        self._fail_after = fail_after
+        self.closed = False
+
+    def __aiter__(self) -> "_FakeStream":
+        return self
+
+    async def __anext__(self) -> _FakeStreamEvent:
+        if self._fail_after is not None and self._fail_after <= 0:
+            raise RuntimeError("upstream stream dropped")
+        if not self._events:
+            raise StopAsyncIteration
+        if self._fail_after is not None:
+            self._fail_after -= 1
+        return self._events.pop(0)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
 class _FakeResponsesApi:
     def __init__(self, output_text: str) -> None:
         self._output_text = output_text
-
-    def create(self, **kwargs):  # noqa: ANN003
+        self.calls = 0
+        self.last_kwargs: dict[str, object] = {}
+        self.stream_fail_after: int | None = None
+        self.last_stream: _FakeStream | None = None
+
+    async def create(self, **kwargs):  # noqa: ANN003
+        self.calls += 1
+        self.last_kwargs = kwargs
+        if kwargs.get("stream"):
+            self.last_stream = _FakeStream(self._output_text, self.stream_fail_after)
+            return self.last_stream
         return _FakeResponse(self._output_text)
 
 
+class _FakeEmbedding:
+    def __init__(self, embedding: list[float]) -> None:
+        self.embedding = embedding
+
+
+class _FakeEmbeddingResult:
+    def __init__(self, embedding: list[float]) -> None:
+        self.data = [_FakeEmbedding(embedding)]
+
+
+class _FakeEmbeddingsApi:
+    def __init__(self, vectors: dict[str, list[float]]) -> None:
+        self._vectors = vectors
+
+    async def create(self, **kwargs):  # noqa: ANN003
+        return _FakeEmbeddingResult(self._vectors.get(kwargs["input"], [0.0, 0.0, 1.0]))
+
+
 class _FakeOpenAIClient:
-    def __init__(self, output_text: str) -> None:
+    def __init__(self, output_text: str, vectors: dict[str, list[float]] | None = None) -> None:
         self.responses = _FakeResponsesApi(output_text)
+        self.embeddings = _FakeEmbeddingsApi(vectors or {})
+
+
+class _FakeRedisPipeline:
+    def __init__(self, store: dict[str, int]) -> None:
+        self._store = store
+        self._commands: list[tuple[str, str]] = []
+
+    async def __aenter__(self) -> "_FakeRedisPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        return None
+
+    def incr(self, key: str) -> "_FakeRedisPipeline":
+        self._commands.append(("incr", key))
+        return self
+
+    def expire(self, key: str, seconds: int) -> "_FakeRedisPipeline":
+        self._commands.append(("expire", key))
+        return self
+
+    async def execute(self) -> list[object]:
+        results: list[object] = []
+        for command, key in self._commands:
+            if command == "incr":
+                self._store[key] = self._store.get(key, 0) + 1
+                results.append(self._store[key])
+            else:
+                results.append(True)
+        return results
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.store: dict[str, int] = {}
+
+    def pipeline(self) -> _FakeRedisPipeline:
+        return _FakeRedisPipeline(self.store)
 
 
 def _reset_rate_limiter() -> None:
-    main._rate_limit_storage.clear()
+    main._counters.clear()
 
 
 def test_health_check() -> None:
@@ -40,6 +142,56 @@ def test_validation_error_missing_feeling() -> None:
     assert response.status_code == 422
     body = response.json()
     assert body["error"] == "ValidationError"
+    assert body["details"][0]["type"] == "missing"
+    assert body["details"][0]["loc"] == ["body", "feeling"]
+
+
+def test_validation_error_reports_unsupported_language_field() -> None:
+    client = TestClient(main.app)
+    response = client.post(
+        "/api/affirmation", json={"name": "Alex", "feeling": "tired out", "language": "xx"}
+    )
+
+    assert response.status_code == 422
+    error = response.json()["details"][0]
+    assert error["type"] == "literal_error"
+    assert error["loc"] == ["body", "language"]
+
+
+def test_openapi_request_schema_includes_length_limits() -> None:
+    client = TestClient(main.app)
+    operation = client.get("/openapi.json").json()["paths"]["/api/affirmation"]["post"]
+    properties = operation["requestBody"]["content"]["application/json"]["schema"]["properties"]
+
+    assert properties["name"]["minLength"] == 1
+    assert properties["feeling"]["maxLength"] == 280
+
+
+def test_validation_error_name_without_valid_characters() -> None:
+    client = TestClient(main.app)
+    response = client.post("/api/affirmation", json={"name": "!!", "feeling": "calm but tired"})
+
+    assert response.status_code == 422
+    body = response.json()
+    assert body["error"] == "ValidationError"
+    assert body["details"][0]["loc"] == ["body", "name"]
+
+
+def test_rejects_non_json_content_type_without_calling_openai(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    fake_client = _FakeOpenAIClient("Alex, you are capable and calm.")
+    monkeypatch.setattr(main, "openai_client", fake_client)
+
+    response = client.post(
+        "/api/affirmation",
+        content=b'{"name": "Alex", "feeling": "nervous before a big presentation"}',
+        headers={"content-type": "text/plain"},
+    )
+
+    assert response.status_code == 415
+    assert response.json()["error"] == "HttpError"
+    assert fake_client.responses.calls == 0
 
 
 def test_affirmation_success(monkeypatch) -> None:  # noqa: ANN001
@@ -72,6 +224,66 @@ def test_affirmation_success_in_requested_language(monkeypatch) -> None:  # noqa
     assert "affirmation" in response.json()
 
 
+def test_affirmation_prompt_keeps_static_prefix_first(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    fake_client = _FakeOpenAIClient("Du bist ruhig und stark.")
+    monkeypatch.setattr(main, "openai_client", fake_client)
+
+    response = client.post(
+        "/api/affirmation",
+        json={"name": "Alex", "feeling": "nervous before exams", "language": "de"},
+    )
+
+    assert response.status_code == 200
+    kwargs = fake_client.responses.last_kwargs
+    assert kwargs["prompt_cache_key"] == main.PROMPT_CACHE_KEY
+    system_message, user_message = kwargs["input"]
+    assert system_message == {"role": "system", "content": main.SAFE_SYSTEM_PROMPT}
+    assert "Preferred language: German" in user_message["content"]
+
+
+def test_affirmation_streams_deltas_when_requested(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    fake_client = _FakeOpenAIClient("Alex, you are capable and calm.")
+    monkeypatch.setattr(main, "openai_client", fake_client)
+
+    response = client.post(
+        "/api/affirmation?stream=true",
+        json={"name": "Alex", "feeling": "nervous before a big presentation"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [chunk for chunk in response.text.split("\n\n") if chunk]
+    deltas = [json.loads(chunk.removeprefix("data: "))["delta"] for chunk in events[:-1]]
+    assert "".join(deltas) == "Alex, you are capable and calm."
+    assert events[-1] == 'event: done\ndata: {"affirmation":"Alex, you are capable and calm."}'
+    assert fake_client.responses.last_stream.closed
+
+
+def test_affirmation_stream_reports_upstream_failure(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    fake_client = _FakeOpenAIClient("Alex, you are capable and calm.")
+    fake_client.responses.stream_fail_after = 2
+    monkeypatch.setattr(main, "openai_client", fake_client)
+
+    response = client.post(
+        "/api/affirmation?stream=true",
+        json={"name": "Alex", "feeling": "nervous before a big presentation"},
+    )
+
+    assert response.status_code == 200
+    events = [chunk for chunk in response.text.split("\n\n") if chunk]
+    assert events[0] == 'data: {"delta":"Alex, yo"}'
+    assert events[-1] == (
+        'event: error\ndata: {"error":"HttpError","message":"Failed to generate affirmation."}'
+    )
+    assert fake_client.responses.last_stream.closed
+
+
 def test_affirmation_returns_error_when_openai_key_missing(monkeypatch) -> None:  # noqa: ANN001
     client = TestClient(main.app)
     _reset_rate_limiter()
@@ -118,3 +330,166 @@ def test_rejects_short_shorthand_feeling_input() -> None:
     assert response.status_code == 422
     body = response.json()
     assert body["error"] == "ValidationError"
+
+
+def test_affirmation_cache_reuses_exact_match(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    main._affirmation_cache.clear()
+    fake_client = _FakeOpenAIClient("Alex, you are capable and calm.")
+    monkeypatch.setattr(main, "AFFIRM_CACHE_ENABLED", True)
+    monkeypatch.setattr(main, "openai_client", fake_client)
+
+    first = client.post("/api/affirmation", json={"name": "Alex", "feeling": "nervous today"})
+    second = client.post("/api/affirmation", json={"name": "alex", "feeling": "  Nervous   TODAY "})
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    assert fake_client.responses.calls == 1
+
+
+def test_affirmation_cache_matches_similar_feeling_for_same_name(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    main._affirmation_cache.clear()
+    fake_client = _FakeOpenAIClient(
+        "Sam, you are steady and enough.",
+        vectors={
+            "nervous today|": [1.0, 0.0, 0.0],
+            "feeling nervous today|": [0.99, 0.05, 0.0],
+        },
+    )
+    monkeypatch.setattr(main, "AFFIRM_CACHE_ENABLED", True)
+    monkeypatch.setattr(main, "openai_client", fake_client)
+
+    client.post("/api/affirmation", json={"name": "Sam", "feeling": "nervous today"})
+    similar = client.post("/api/affirmation", json={"name": "Sam", "feeling": "feeling nervous today"})
+    other_name = client.post("/api/affirmation", json={"name": "Alex", "feeling": "feeling nervous today"})
+
+    assert similar.status_code == 200
+    assert other_name.status_code == 200
+    assert fake_client.responses.calls == 2
+
+
+def test_rejects_emoji_mixed_into_descriptive_feeling() -> None:
+    client = TestClient(main.app)
+    response = client.post(
+        "/api/affirmation", json={"name": "Alex", "feeling": "anxious about work 😟"}
+    )
+
+    assert response.status_code == 422
+    body = response.json()
+    assert body["error"] == "ValidationError"
+
+
+def test_health_check_is_not_rate_limited(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    monkeypatch.setattr(main, "RATE_LIMIT_MAX_REQUESTS", 1)
+
+    responses = [client.get("/health") for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert not main._counters
+
+
+def test_rate_limit_counters_are_capped(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    monkeypatch.setattr(main, "RATE_LIMIT_MAX_CLIENTS", 2)
+    monkeypatch.setattr(main, "openai_client", _FakeOpenAIClient("You are steady and enough."))
+
+    for address in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        response = client.post(
+            "/api/affirmation",
+            json={"name": "Sam", "feeling": "tired"},
+            headers={"x-forwarded-for": address},
+        )
+        assert response.status_code == 200
+
+    assert [client_id for client_id, _ in main._counters] == ["10.0.0.2", "10.0.0.3"]
+
+
+def test_rate_limit_uses_redis_when_configured(monkeypatch) -> None:  # noqa: ANN001
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    fake_redis = _FakeRedis()
+    monkeypatch.setattr(main, "redis_client", fake_redis)
+    monkeypatch.setattr(main, "RATE_LIMIT_MAX_REQUESTS", 1)
+    monkeypatch.setattr(main, "openai_client", _FakeOpenAIClient("You are steady and enough."))
+
+    first = client.post("/api/affirmation", json={"name": "Sam", "feeling": "tired"})
+    second = client.post("/api/affirmation", json={"name": "Sam", "feeling": "tired"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert not main._counters
+    assert list(fake_redis.store.values()) == [2]
+
+
+def test_concurrent_identical_requests_share_one_generation(monkeypatch) -> None:  # noqa: ANN001
+    calls = 0
+
+    async def fake_generate(payload: main.AffirmationRequest, embedding: object) -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return f"{payload.name}, you are steady and enough."
+
+    monkeypatch.setattr(main, "_generate_affirmation", fake_generate)
+    payload = main.AffirmationRequest(name="Sam", feeling="tired after work")
+
+    async def run_burst() -> list[str]:
+        return await asyncio.gather(*(main._coalesced_affirmation(payload, None) for _ in range(5)))
+
+    results = asyncio.run(run_burst())
+
+    assert calls == 1
+    assert set(results) == {"Sam, you are steady and enough."}
+    assert not main._in_flight
+
+
+def test_rejects_emoji_directly_after_letters() -> None:
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    response = client.post("/api/affirmation", json={"name": "Alex", "feeling": "abc\u2776 long day"})
+
+    assert response.status_code == 422
+    assert "emoji" in response.json()["details"][0]["msg"]
+
+
+def test_numeric_symbols_do_not_count_as_letters() -> None:
+    client = TestClient(main.app)
+    _reset_rate_limiter()
+    response = client.post("/api/affirmation", json={"name": "Alex", "feeling": "\u00bd\u00bd\u00bd a"})
+
+    assert response.status_code == 422
+    assert "valid words" in response.json()["details"][0]["msg"]
+
+
+def test_follower_generates_when_leader_is_cancelled(monkeypatch) -> None:  # noqa: ANN001
+    calls = 0
+
+    async def fake_generate(payload: main.AffirmationRequest, embedding: object) -> str:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(10)
+        return f"{payload.name}, you are steady and enough."
+
+    monkeypatch.setattr(main, "_generate_affirmation", fake_generate)
+    payload = main.AffirmationRequest(name="Sam", feeling="tired after work")
+
+    async def run_with_cancelled_leader() -> str:
+        leader = asyncio.create_task(main._coalesced_affirmation(payload, None))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(main._coalesced_affirmation(payload, None))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    result = asyncio.run(run_with_cancelled_leader())
+
+    assert result == "Sam, you are steady and enough."
+    assert calls == 2
+    assert not main._in_flight